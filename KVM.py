@@ -9,22 +9,85 @@ import os
 import sys
 import json
 import socket
+import selectors
+import struct
 import threading
 import subprocess
 import platform
 import shutil
+import stat
 import time
+import collections
+import functools
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_FILE = os.path.join(SCRIPT_DIR, "kvm_config.json")
 VENV_DIR = os.path.join(SCRIPT_DIR, "kvm_venv")
+CACHE_DIR = os.path.join(SCRIPT_DIR, "kvm_cache")
+VENV_SKELETON_DIR = os.path.join(CACHE_DIR, f"venv-skeleton-py{sys.version_info.major}{sys.version_info.minor}")
+WHEEL_DIR = os.path.join(CACHE_DIR, "wheels")
 PORT = 24800
 BUFFER_SIZE = 4096
+HANDSHAKE_TIMEOUT = 5.0  # seconds a new connection has to identify itself
+RECV_BUFFER_SIZE = 1 << 17  # client receive buffer, at most one partial frame (up to 65537 bytes) is kept in it
+SEND_INTERVAL = 0.002  # minimum seconds between batches, caps sends at 500/s
+SOCKET_SEND_BUFFER = 16384  # small, so a backlog waits in our queue where moves coalesce
+SOCKET_RECV_BUFFER = 262144  # client side, holds bursts while input is injected
+KEEPALIVE_IDLE = 10  # seconds of silence before probing the peer
+KEEPALIVE_INTERVAL = 3  # seconds between unanswered probes
+KEEPALIVE_COUNT = 3  # unanswered probes before the connection is dropped
 VERSION = "1.0.0"
+REQUIRED_PACKAGES = ["pynput", "Pillow"]
+MIN_PIP_MAJOR = 23  # older pips get upgraded before installing packages
+PIP_INSTALL_FLAGS = ["--disable-pip-version-check", "--default-timeout", "600", "--retries", "10"]
 
-def get_platform():
+# Wire protocol: every frame is a 2-byte length followed by a type byte.
+# Input events use fixed binary bodies, only the handshake is JSON.
+# Coordinates are scaled to 0..MOVE_RANGE (first to last pixel).
+TYPE_JSON = 0
+TYPE_MOVE = 1
+TYPE_CLICK = 2
+TYPE_SCROLL = 3
+TYPE_KEY = 4
+TYPE_CHAR = 5
+TYPE_SWITCH = 6
+TYPE_RETURN = 7
+FRAME_HEADER = struct.Struct("!H")
+JSON_HEADER = struct.Struct("!HB")
+MOVE_BODY = struct.Struct("!BHH")  # type, x, y
+CLICK_BODY = struct.Struct("!BBB")  # type, button id, pressed
+SCROLL_BODY = struct.Struct("!Bhh")  # type, dx, dy
+KEY_BODY = struct.Struct("!BBB")  # type, pressed, special key id
+CHAR_BODY = struct.Struct("!BB")  # type, pressed (UTF-8 character follows)
+SWITCH_BODY = struct.Struct("!BHH")  # type, x, y
+RETURN_BODY = struct.Struct("!B")  # type
+MOVE_RANGE = 65535
+
+# Mouse buttons and special keys travel as their index in these tables
+MOUSE_BUTTONS = ("left", "right", "middle")
+SPECIAL_KEYS = (
+    "space", "enter", "tab", "backspace", "esc",
+    "shift", "shift_r", "ctrl", "ctrl_r", "alt", "alt_r",
+    "up", "down", "left", "right",
+    "delete", "home", "end", "page_up", "page_down",
+    # Appended so the ids above stay stable
+    "shift_l", "ctrl_l", "alt_l", "alt_gr", "cmd", "cmd_l", "cmd_r",
+    "caps_lock", "num_lock", "scroll_lock", "insert", "menu", "pause", "print_screen",
+) + tuple(f"f{n}" for n in range(1, 21)) + (
+    "media_play_pause", "media_volume_mute", "media_volume_down", "media_volume_up",
+    "media_previous", "media_next",
+)
+
+def detect_platform():
     """Detect operating system"""
     system = platform.system().lower()
     if system == "windows":
@@ -34,6 +97,18 @@ def get_platform():
     else:
         return "unsupported"
 
+# The OS never changes while running, so detect it once
+PLATFORM = detect_platform()
+
+if PLATFORM == "windows":
+    VENV_PYTHON = os.path.join(VENV_DIR, "Scripts", "python.exe")
+else:
+    VENV_PYTHON = os.path.join(VENV_DIR, "bin", "python")
+
+def get_platform():
+    """Return the cached operating system name"""
+    return PLATFORM
+
 def print_header():
     """Print application header"""
     print("\n" + "="*60)
@@ -41,16 +116,44 @@ def print_header():
     print("Mouse & Keyboard Sharing Tool")
     print("="*60)
 
+def run_command(args, **kwargs):
+    """Run a command without the child's close-all-fds pass"""
+    # With a full program path and close_fds=False, subprocess on Linux starts
+    # the child with posix_spawn instead of fork+exec
+    env = kwargs.get("env") or os.environ
+    program = shutil.which(args[0], path=env.get("PATH"))
+    if program:
+        args = [program, *args[1:]]
+    # Our descriptors are non-inheritable (PEP 446), so closing them is wasted work
+    return subprocess.run(args, close_fds=False, **kwargs)
+
+def apt_env():
+    """Small environment for apt, just enough to find binaries"""
+    return {"PATH": os.environ.get("PATH", os.defpath), "LANG": "C"}
+
+def apt_lists_fresh(max_age=86400):
+    """Check whether the apt package indexes were downloaded recently"""
+    # The directory itself says nothing (purged lists leave it freshly
+    # modified), so look at the Packages indexes apt actually reads
+    try:
+        newest = max((entry.stat().st_mtime for entry in os.scandir("/var/lib/apt/lists")
+                      if "_Packages" in entry.name), default=0)
+    except OSError:
+        return False
+    return time.time() - newest < max_age
+
 def install_system_dependencies_linux():
     """Install system dependencies on Linux"""
     print("\n→ Installing system dependencies (Linux)...")
     
     try:
-        # Update package list
-        subprocess.run(["sudo", "apt", "update"], check=False, capture_output=True, timeout=60)
+        def update_lists():
+            run_command(["sudo", "apt-get", "update"], check=False, stdin=subprocess.DEVNULL, env=apt_env(), timeout=60)
         
-        # Fix any broken packages
-        subprocess.run(["sudo", "apt", "--fix-broken", "install", "-y"], check=False, capture_output=True, timeout=60)
+        # Update package list (skipped when it was refreshed in the last day)
+        updated = not apt_lists_fresh()
+        if updated:
+            update_lists()
         
         # Try version-specific packages first (e.g., python3.10-venv)
         python_version = f"{sys.version_info.major}.{sys.version_info.minor}"
@@ -59,28 +162,42 @@ def install_system_dependencies_linux():
             f"python{python_version}-dev"
         ]
         
-        generic_packages = ["python3-tk", "gcc", "build-essential"]
+        generic_packages = ["gcc", "build-essential"]
         
-        # Try version-specific first
-        result = subprocess.run(
-            ["sudo", "apt", "install", "-y"] + version_specific + generic_packages,
-            check=False,
-            capture_output=True,
-            timeout=300
-        )
+        # One apt-get run also repairs broken packages
+        install_cmd = ["sudo", "apt-get", "install", "-y", "--fix-broken"]
         
-        if result.returncode != 0:
-            # Fall back to generic python3-venv and python3-dev
-            print("→ Trying generic packages...")
-            result = subprocess.run(
-                ["sudo", "apt", "install", "-y", "python3-venv", "python3-dev"] + generic_packages,
+        def install_packages():
+            # Try version-specific first
+            result = run_command(
+                install_cmd + version_specific + generic_packages,
                 check=False,
-                capture_output=True,
+                stdin=subprocess.DEVNULL,
+                env=apt_env(),
                 timeout=300
             )
+            
+            if result.returncode != 0:
+                # Fall back to generic python3-venv and python3-dev
+                print("→ Trying generic packages...")
+                result = run_command(
+                    install_cmd + ["python3-venv", "python3-dev"] + generic_packages,
+                    check=False,
+                    stdin=subprocess.DEVNULL,
+                    env=apt_env(),
+                    timeout=300
+                )
+            return result
+        
+        result = install_packages()
+        if result.returncode != 0 and not updated:
+            # The lists looked fresh but apt could not find the packages
+            print("→ Refreshing package lists and retrying...")
+            update_lists()
+            install_packages()
         
         # Check if critical packages are available
-        has_dev = subprocess.run(["which", "gcc"], capture_output=True, timeout=5).returncode == 0
+        has_dev = shutil.which("gcc") is not None
         
         if has_dev:
             print("✓ System dependencies ready!")
@@ -96,13 +213,67 @@ def install_system_dependencies_linux():
         print(f"✗ Error during installation: {e}")
         return False
 
+@functools.lru_cache(maxsize=1)
 def check_dependencies_installed():
     """Check if Python dependencies are already installed"""
+    # Locate the packages without importing them (pynput loads its backends on import)
+    return all(importlib.util.find_spec(name) is not None for name in ("pynput", "PIL"))
+
+def copy_tree_linked(src, dst):
+    """Copy a directory tree, hardlinking files where the filesystem allows it"""
+    def link_or_copy(src_file, dst_file):
+        try:
+            os.link(src_file, dst_file)
+        except OSError:
+            shutil.copy2(src_file, dst_file)
+    
+    shutil.copytree(src, dst, symlinks=True, copy_function=link_or_copy)
+
+def cache_venv_skeleton():
+    """Keep a pristine copy of the fresh venv so later setups skip ensurepip"""
     try:
-        import pynput
-        from PIL import Image
+        if os.path.exists(VENV_SKELETON_DIR):
+            shutil.rmtree(VENV_SKELETON_DIR)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        copy_tree_linked(VENV_DIR, VENV_SKELETON_DIR)
+    except Exception as e:
+        print(f"⚠ Could not cache virtual environment: {e}")
+
+def restore_venv_skeleton():
+    """Recreate the venv from the cached skeleton"""
+    try:
+        copy_tree_linked(VENV_SKELETON_DIR, VENV_DIR)
         return True
-    except ImportError:
+    except Exception as e:
+        print(f"⚠ Cached virtual environment unusable: {e}")
+        shutil.rmtree(VENV_DIR, ignore_errors=True)
+        return False
+
+def get_pip_major(python_path):
+    """Major version of the pip inside an interpreter (0 if unknown)"""
+    try:
+        result = run_command(
+            [python_path, "-m", "pip", "--version", "--disable-pip-version-check"],
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        # "pip 23.2.1 from ... (python 3.11)"
+        return int(result.stdout.split()[1].split(".")[0])
+    except (subprocess.SubprocessError, OSError, IndexError, ValueError):
+        return 0
+
+def prefetch_wheels():
+    """Download the required packages into the cache while other setup runs"""
+    try:
+        result = run_command(
+            [sys.executable, "-m", "pip", "download", "--dest", WHEEL_DIR] + PIP_INSTALL_FLAGS + REQUIRED_PACKAGES,
+            capture_output=True,
+            timeout=600
+        )
+        return result.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        # No pip next to the system Python; the venv's pip downloads them instead
         return False
 
 def setup_environment():
@@ -116,17 +287,30 @@ def setup_environment():
     
     print("\n→ Setting up Python environment...")
     
+    # Fetch packages in the background while apt and venv creation run
+    executor = ThreadPoolExecutor(max_workers=1)
+    prefetch = executor.submit(prefetch_wheels)
+    executor.shutdown(wait=False)
+    
+    # A cached skeleton means system dependencies were handled on a previous run
+    has_skeleton = os.path.exists(VENV_SKELETON_DIR)
+    
     # On Linux, try to install system dependencies first
-    if system == "linux" and not os.path.exists(VENV_DIR):
+    if system == "linux" and not os.path.exists(VENV_DIR) and not has_skeleton:
         if not install_system_dependencies_linux():
             print("⚠ System dependencies installation had issues")
     
+    # Reuse the cached skeleton (hardlinked, no ensurepip run)
+    if not os.path.exists(VENV_DIR) and has_skeleton:
+        if restore_venv_skeleton():
+            print("✓ Virtual environment restored from cache")
+    
     # Try to create venv
     if not os.path.exists(VENV_DIR):
         print("→ Creating virtual environment...")
         try:
             # Try with --copies for compatibility
-            result = subprocess.run(
+            result = run_command(
                 [sys.executable, "-m", "venv", "--copies", VENV_DIR],
                 check=False,
                 capture_output=True,
@@ -135,7 +319,7 @@ def setup_environment():
             
             if result.returncode != 0:
                 # Try without --copies
-                result = subprocess.run(
+                result = run_command(
                     [sys.executable, "-m", "venv", VENV_DIR],
                     check=False,
                     capture_output=True,
@@ -144,67 +328,63 @@ def setup_environment():
             
             if result.returncode == 0:
                 print("✓ Virtual environment created")
+                cache_venv_skeleton()
             else:
                 raise Exception("Venv creation failed")
                 
         except Exception as e:
             print(f"✗ Virtual environment creation failed: {e}")
             print("→ Falling back to user installation...")
-            return install_to_user()
+            # Let the download finish and install from it instead of fetching twice
+            return install_to_user(prefetch.result())
     
     # Install packages in venv
-    if system == "windows":
-        pip_path = os.path.join(VENV_DIR, "Scripts", "pip.exe")
-        python_path = os.path.join(VENV_DIR, "Scripts", "python.exe")
-    else:
-        pip_path = os.path.join(VENV_DIR, "bin", "pip")
-        python_path = os.path.join(VENV_DIR, "bin", "python")
+    python_path = VENV_PYTHON
     
     print("→ Installing Python packages...")
     try:
-        # Install packages directly without pip upgrade
-        result = subprocess.run(
-            [pip_path, "install", "pynput", "Pillow"],
-            capture_output=True,
-            timeout=300,
-            text=True
+        # Single pip run: one resolver pass, progress streamed live. pip is only
+        # upgraded when it is too old. Go through "python -m pip" since pip.exe
+        # cannot upgrade itself on Windows.
+        packages = list(REQUIRED_PACKAGES)
+        if get_pip_major(python_path) < MIN_PIP_MAJOR:
+            packages.insert(0, "pip")
+        
+        # Prefer the prefetched files, the index still fills any gaps
+        find_links = ["--find-links", WHEEL_DIR] if prefetch.result() else []
+        
+        result = run_command(
+            [python_path, "-m", "pip", "install", "--upgrade"] + PIP_INSTALL_FLAGS + find_links + packages,
+            timeout=600
         )
         
         if result.returncode == 0:
             print("✓ Python packages installed!")
             return python_path
-        else:
-            # Try without capture for better visibility
-            print("→ Retrying installation...")
-            result = subprocess.run(
-                [pip_path, "install", "pynput", "Pillow"],
-                timeout=300
-            )
-            if result.returncode == 0:
-                print("✓ Python packages installed!")
-                return python_path
-            raise Exception("Package installation failed")
+        raise Exception("Package installation failed")
             
     except subprocess.TimeoutExpired:
         print("✗ Installation timed out")
         print("→ Falling back to user installation...")
-        return install_to_user()
+        return install_to_user(prefetch.result())
     except Exception as e:
         print(f"✗ Package installation failed: {e}")
         print("→ Falling back to user installation...")
-        return install_to_user()
+        return install_to_user(prefetch.result())
 
-def install_to_user():
+def install_to_user(prefetched=False):
     """Install packages to user directory as fallback"""
     print("\n→ Installing to user directory (no venv)...")
+    find_links = ["--find-links", WHEEL_DIR] if prefetched else []
     try:
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--user", "pynput", "Pillow"],
-            timeout=300
+        result = run_command(
+            [sys.executable, "-m", "pip", "install", "--user"] + PIP_INSTALL_FLAGS + find_links + REQUIRED_PACKAGES,
+            timeout=600
         )
         
         if result.returncode == 0:
             print("✓ Packages installed to user directory!")
+            check_dependencies_installed.cache_clear()
             return None  # Signal to continue without venv
         else:
             print("\n✗ Installation failed")
@@ -222,8 +402,36 @@ def install_to_user():
         print(f"✗ Installation error: {e}")
         sys.exit(1)
 
-def cleanup():
-    """Delete virtual environment and config"""
+def force_remove(func, path, _exc):
+    """rmtree error handler: clear the read-only bit and retry"""
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+def unlink_quiet(path):
+    """Unlink a file, leaving failures to the rmtree pass"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def remove_tree(path):
+    """Delete a directory tree, unlinking its files in parallel first"""
+    files = []
+    for root, _dirs, names in os.walk(path):
+        files.extend(os.path.join(root, name) for name in names)
+    
+    # unlink releases the GIL, so a thread pool overlaps the syscalls
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(unlink_quiet, files))
+    
+    # Remove the now (mostly) empty directories; retry read-only leftovers
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=force_remove)
+    else:
+        shutil.rmtree(path, onerror=force_remove)
+
+def cleanup(purge_cache=False):
+    """Delete virtual environment and config, and the package cache if asked"""
     print("\n→ Cleaning up...")
     
     removed = []
@@ -231,7 +439,7 @@ def cleanup():
     # Remove venv
     if os.path.exists(VENV_DIR):
         try:
-            shutil.rmtree(VENV_DIR)
+            remove_tree(VENV_DIR)
             removed.append("Virtual environment")
         except Exception as e:
             print(f"✗ Failed to remove venv: {e}")
@@ -244,6 +452,14 @@ def cleanup():
         except Exception as e:
             print(f"✗ Failed to remove config: {e}")
     
+    # Remove cached venv skeleton and downloaded packages
+    if purge_cache and os.path.exists(CACHE_DIR):
+        try:
+            remove_tree(CACHE_DIR)
+            removed.append("Package cache")
+        except Exception as e:
+            print(f"✗ Failed to remove cache: {e}")
+    
     if removed:
         print(f"✓ Removed: {', '.join(removed)}")
     else:
@@ -251,52 +467,396 @@ def cleanup():
     
     print("Cleanup complete!")
 
+if orjson is not None:
+    dumps_bytes = orjson.dumps
+else:
+    def dumps_bytes(data):
+        """Compact JSON encoding straight to bytes"""
+        return json.dumps(data, separators=(",", ":")).encode()
+
+def frame_struct(body):
+    """Struct packing a whole frame (length prefix + body) in one call"""
+    return struct.Struct("!H" + body.format.lstrip("!"))
+
+MOVE_FRAME = frame_struct(MOVE_BODY)
+CLICK_FRAME = frame_struct(CLICK_BODY)
+SCROLL_FRAME = frame_struct(SCROLL_BODY)
+KEY_FRAME = frame_struct(KEY_BODY)
+CHAR_FRAME = frame_struct(CHAR_BODY)
+SWITCH_FRAME = frame_struct(SWITCH_BODY)
+RETURN_FRAME = frame_struct(RETURN_BODY)
+
+# Bodies that decode to a plain tuple, (type, field, ...)
+FIXED_BODIES = {
+    TYPE_MOVE: MOVE_BODY,
+    TYPE_CLICK: CLICK_BODY,
+    TYPE_SCROLL: SCROLL_BODY,
+    TYPE_KEY: KEY_BODY,
+    TYPE_SWITCH: SWITCH_BODY,
+    TYPE_RETURN: RETURN_BODY,
+}
+
+def encode_json_frame(data):
+    """Encode a control message as a length-prefixed JSON frame"""
+    payload = dumps_bytes(data)
+    return JSON_HEADER.pack(len(payload) + 1, TYPE_JSON) + payload
+
+def encode_char_frame(char, pressed):
+    """Encode a character key event (the character is sent as UTF-8)"""
+    payload = char.encode("utf-8")
+    return CHAR_FRAME.pack(CHAR_BODY.size + len(payload), TYPE_CHAR, pressed) + payload
+
+def frame_type(frame):
+    """Type byte of an encoded frame"""
+    return frame[FRAME_HEADER.size]
+
+def decode_frames(buffer, size=None):
+    """Decode the complete frames at the start of buffer, return (messages, bytes consumed)"""
+    # Messages are tuples led by the frame type: (TYPE_MOVE, x, y), ...,
+    # (TYPE_CHAR, pressed, char) and (TYPE_JSON, data)
+    messages = []
+    offset = 0
+    if size is None:
+        size = len(buffer)
+    
+    while size - offset >= FRAME_HEADER.size:
+        (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+        start = offset + FRAME_HEADER.size
+        end = start + length
+        if end > size:
+            break
+        offset = end
+        
+        # Empty, malformed and unknown frames are skipped, the length says where the next one starts
+        if length == 0:
+            continue
+        kind = buffer[start]
+        body = FIXED_BODIES.get(kind)
+        
+        if body is not None:
+            if length == body.size:
+                messages.append(body.unpack_from(buffer, start))
+        
+        elif kind == TYPE_CHAR:
+            if length > CHAR_BODY.size:
+                _, pressed = CHAR_BODY.unpack_from(buffer, start)
+                char = bytes(buffer[start + CHAR_BODY.size:end]).decode("utf-8", "replace")
+                messages.append((TYPE_CHAR, pressed, char))
+        
+        elif kind == TYPE_JSON:
+            messages.append((TYPE_JSON, json.loads(buffer[start + 1:end])))
+    
+    return messages, offset
+
+def coalesce_moves(commands):
+    """Keep only the last mouse move of each consecutive run of moves"""
+    result = []
+    for cmd in commands:
+        if cmd[0] == TYPE_MOVE and result and result[-1][0] == TYPE_MOVE:
+            result[-1] = cmd
+        else:
+            result.append(cmd)
+    return result
+
+# Per-call non-blocking recv where the platform has it (not on Windows)
+RECV_NOWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+def tune_socket(sock):
+    """Disable Nagle, bound the kernel send buffer and detect dead peers"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SEND_BUFFER)
+    
+    # A peer that vanished (unplugged, suspended) would otherwise leave the
+    # connection open forever, since neither side writes while idle
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for name, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+                        ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                        ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+        if hasattr(socket, name):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+            except OSError:
+                pass
+
+# Gather writes (POSIX); batches longer than IOV_MAX are joined instead
+HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+SENDMSG_MAX_BUFFERS = 1024
+
+def send_frames(sock, frames):
+    """Write a batch of frames, with one gather syscall where available"""
+    if len(frames) == 1:
+        sock.sendall(frames[0])
+    elif HAS_SENDMSG and len(frames) <= SENDMSG_MAX_BUFFERS:
+        sent = sock.sendmsg(frames)
+        # Finish a short write (e.g. interrupted by a signal)
+        if sent < sum(map(len, frames)):
+            sock.sendall(b"".join(frames)[sent:])
+    else:
+        sock.sendall(b"".join(frames))
+
+def quickack(sock):
+    """Ask Linux to ACK immediately (the flag resets, so re-arm after reads)"""
+    if hasattr(socket, "TCP_QUICKACK"):
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        except OSError:
+            pass
+
+def x11_screen_size():
+    """Read the screen size straight from libX11, without a GUI toolkit"""
+    import ctypes
+    
+    try:
+        xlib = ctypes.CDLL("libX11.so.6")
+    except OSError:
+        return None
+    
+    # Display* is a pointer; the default int restype would truncate it
+    xlib.XOpenDisplay.restype = ctypes.c_void_p
+    xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+    xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    
+    display = xlib.XOpenDisplay(None)
+    if not display:
+        return None
+    try:
+        screen = xlib.XDefaultScreen(display)
+        return xlib.XDisplayWidth(display, screen), xlib.XDisplayHeight(display, screen)
+    finally:
+        xlib.XCloseDisplay(display)
+
+def drm_screen_size():
+    """Read the first connected monitor's preferred mode from sysfs (no X needed)"""
+    try:
+        connectors = sorted(os.listdir("/sys/class/drm"))
+    except OSError:
+        return None
+    
+    for name in connectors:
+        base = os.path.join("/sys/class/drm", name)
+        try:
+            with open(os.path.join(base, "status")) as f:
+                if f.read().strip() != "connected":
+                    continue
+            with open(os.path.join(base, "modes")) as f:
+                mode = f.readline().strip()
+        except OSError:
+            continue
+        
+        # Modes look like "1920x1080" (interlaced ones end in "i")
+        width, _, height = mode.rstrip("i").partition("x")
+        if width.isdigit() and height.isdigit():
+            return int(width), int(height)
+    return None
+
+def get_screen_size():
+    """Detect screen dimensions (falls back to 1920x1080)"""
+    try:
+        system = get_platform()
+        if system == "linux":
+            size = x11_screen_size() or drm_screen_size()
+            if size:
+                return size
+        elif system == "windows":
+            import ctypes
+            user32 = ctypes.windll.user32
+            return user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
+    except:
+        pass
+    return 1920, 1080
+
+def windows_mouse_mover(width, height):
+    """Return (move, close) injecting absolute moves via user32.SendInput, or None"""
+    import ctypes
+    from ctypes import wintypes
+    
+    try:
+        user32 = ctypes.WinDLL("user32")
+    except (AttributeError, OSError):
+        return None
+    
+    INPUT_MOUSE = 0
+    MOUSEEVENTF_MOVE = 0x0001
+    MOUSEEVENTF_ABSOLUTE = 0x8000
+    
+    class MOUSEINPUT(ctypes.Structure):
+        _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG),
+                    ("mouseData", wintypes.DWORD), ("dwFlags", wintypes.DWORD),
+                    ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)]
+    
+    class KEYBDINPUT(ctypes.Structure):
+        _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD),
+                    ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                    ("dwExtraInfo", ctypes.c_size_t)]
+    
+    class INPUTUNION(ctypes.Union):
+        _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT)]
+    
+    class INPUT(ctypes.Structure):
+        _fields_ = [("type", wintypes.DWORD), ("u", INPUTUNION)]
+    
+    send_input = user32.SendInput
+    send_input.argtypes = (wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+    send_input.restype = wintypes.UINT
+    
+    # One INPUT reused for every move, only the coordinates change
+    event = INPUT(type=INPUT_MOUSE)
+    mi = event.u.mi
+    mi.dwFlags = MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE
+    event_ref = ctypes.byref(event)
+    event_size = ctypes.sizeof(INPUT)
+    
+    # Absolute coordinates span 0..65535 across the primary screen
+    scale_x = 65535 / max(width - 1, 1)
+    scale_y = 65535 / max(height - 1, 1)
+    
+    def move(x, y):
+        mi.dx = round(x * scale_x)
+        mi.dy = round(y * scale_y)
+        send_input(1, event_ref, event_size)
+    
+    # Nothing to release, SendInput needs no device
+    return move, None
+
+def uinput_mouse_mover(width, height):
+    """Return (move, close) writing absolute events to a /dev/uinput pointer, or None"""
+    import fcntl
+    
+    # <linux/uinput.h> and <linux/input-event-codes.h>
+    UI_SET_EVBIT = 0x40045564
+    UI_SET_KEYBIT = 0x40045565
+    UI_SET_ABSBIT = 0x40045567
+    UI_DEV_CREATE = 0x5501
+    UI_DEV_DESTROY = 0x5502
+    EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+    ABS_X, ABS_Y = 0x00, 0x01
+    BTN_LEFT = 0x110
+    BUS_VIRTUAL = 0x06
+    ABS_CNT = 64
+    
+    try:
+        fd = os.open("/dev/uinput", os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        return None
+    
+    try:
+        fcntl.ioctl(fd, UI_SET_EVBIT, EV_KEY)
+        # A button makes udev classify the absolute device as a mouse
+        fcntl.ioctl(fd, UI_SET_KEYBIT, BTN_LEFT)
+        fcntl.ioctl(fd, UI_SET_EVBIT, EV_ABS)
+        fcntl.ioctl(fd, UI_SET_ABSBIT, ABS_X)
+        fcntl.ioctl(fd, UI_SET_ABSBIT, ABS_Y)
+        
+        # struct uinput_user_dev: name, id, ff_effects_max, absmax/absmin/absfuzz/absflat
+        absmax = [0] * ABS_CNT
+        absmax[ABS_X] = width - 1
+        absmax[ABS_Y] = height - 1
+        setup = struct.pack(f"80sHHHHI{ABS_CNT}i{ABS_CNT * 3 * 4}x", b"KVM Share pointer",
+                            BUS_VIRTUAL, 0x1, 0x1, 1, 0, *absmax)
+        os.write(fd, setup)
+        fcntl.ioctl(fd, UI_DEV_CREATE)
+    except OSError:
+        os.close(fd)
+        return None
+    
+    # X, Y and SYN input_events written with one syscall (the kernel fills in the time)
+    pack_events = struct.Struct("llHHi" * 3).pack
+    write = os.write
+    
+    def move(x, y):
+        try:
+            write(fd, pack_events(0, 0, EV_ABS, ABS_X, x,
+                                  0, 0, EV_ABS, ABS_Y, y,
+                                  0, 0, EV_SYN, 0, 0))
+        except BlockingIOError:
+            pass
+    
+    def close():
+        # Remove the virtual pointer, then release its fd
+        try:
+            fcntl.ioctl(fd, UI_DEV_DESTROY)
+        except OSError:
+            pass
+        os.close(fd)
+    
+    return move, close
+
+def native_mouse_mover(width, height):
+    """Return an OS-level (move, close) for this platform, or None to use pynput"""
+    if PLATFORM == "windows":
+        return windows_mouse_mover(width, height)
+    if PLATFORM == "linux":
+        return uinput_mouse_mover(width, height)
+    return None
+
+_pynput = None
+
+def load_pynput():
+    """Import pynput on first use and return its (mouse, keyboard) modules"""
+    global _pynput
+    if _pynput is None:
+        import pynput
+        _pynput = pynput
+    return _pynput.mouse, _pynput.keyboard
+
+_local_ip = None
+
 def get_local_ip():
     """Get local IP address"""
+    global _local_ip
+    if _local_ip is not None:
+        return _local_ip
+    
+    # A UDP connect() sends nothing, it only asks the routing table which
+    # interface reaches the internet (and so the LAN the clients are on)
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.settimeout(2)
         s.connect(("8.8.8.8", 80))
         ip = s.getsockname()[0]
         s.close()
-        return ip
     except:
+        # Not remembered: the network may be up by the next server start
         return "127.0.0.1"
+    _local_ip = ip
+    return ip
 
 class KVMServer:
     """Server that shares mouse and keyboard"""
     
     def __init__(self, port=PORT):
-        from pynput import mouse, keyboard
+        mouse, keyboard = load_pynput()
         
         self.port = port
         self.clients = []
+        self._clients_set = set()  # same sockets as self.clients, O(1) membership
         self.client_positions = {}
+        self._by_position = {}  # position -> client socket, for edge hits
+        self.client_buffers = {}
+        self._handshake_deadlines = {}  # accepted socket -> monotonic deadline for its handshake
         self.running = False
         self.server_socket = None
+        self.selector = None
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
         self.mouse_controller = mouse.Controller()
         self.keyboard_controller = keyboard.Controller()
         self.current_screen = "server"
         self.active_client = None
-        self.screen_width = 1920
-        self.screen_height = 1080
+        self.screen_width, self.screen_height = get_screen_size()
         
-        # Get actual screen dimensions
-        try:
-            system = get_platform()
-            if system == "linux":
-                import tkinter as tk
-                root = tk.Tk()
-                self.screen_width = root.winfo_screenwidth()
-                self.screen_height = root.winfo_screenheight()
-                root.destroy()
-            elif system == "windows":
-                import ctypes
-                user32 = ctypes.windll.user32
-                self.screen_width = user32.GetSystemMetrics(0)
-                self.screen_height = user32.GetSystemMetrics(1)
-        except:
-            pass
+        # Outgoing messages, drained by the sender thread in batches.
+        # Not bounded: dropping key/click events would leave keys stuck,
+        # and consecutive mouse moves are collapsed so it stays short.
+        self._sendq = collections.deque()
+        self._sendq_cv = threading.Condition()
+        
+        # Multiply instead of divide when scaling coordinates
+        self._move_scale_x = MOVE_RANGE / max(self.screen_width - 1, 1)
+        self._move_scale_y = MOVE_RANGE / max(self.screen_height - 1, 1)
+        self._pack_switch = functools.partial(SWITCH_FRAME.pack, SWITCH_BODY.size, TYPE_SWITCH)
     
     def start(self):
         """Start the server"""
@@ -310,8 +870,15 @@ class KVMServer:
         except OSError as e:
             print(f"\n✗ Failed to start server: {e}")
             print(f"Port {self.port} may already be in use.")
+            self.close_wakeup()
             return
         
+        # The acknowledgment is identical for every client, encode it once
+        self._handshake_bytes = encode_json_frame({
+            "status": "connected",
+            "server_screen": {"width": self.screen_width, "height": self.screen_height}
+        })
+        
         ip = get_local_ip()
         print(f"\n{'='*60}")
         print(f"SERVER STARTED")
@@ -322,8 +889,9 @@ class KVMServer:
         print(f"Press Ctrl+C to stop")
         print(f"{'='*60}\n")
         
-        # Start accepting clients
-        threading.Thread(target=self.accept_clients, daemon=True).start()
+        # Start the network event loop and the batched sender
+        threading.Thread(target=self.event_loop, daemon=True).start()
+        threading.Thread(target=self.sender_loop, daemon=True).start()
         
         # Start mouse/keyboard capture
         try:
@@ -331,141 +899,261 @@ class KVMServer:
         except KeyboardInterrupt:
             self.stop()
     
-    def accept_clients(self):
-        """Accept client connections"""
+    def event_loop(self):
+        """Single thread handling accepts, handshakes and client messages"""
+        self.selector = selectors.DefaultSelector()
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ)
+        
         while self.running:
+            # Sleep no longer than the first pending handshake may take
+            timeout = None
+            if self._handshake_deadlines:
+                timeout = max(min(self._handshake_deadlines.values()) - time.monotonic(), 0)
+            
+            for key, _ in self.selector.select(timeout):
+                sock = key.fileobj
+                if sock is self.server_socket:
+                    self.accept_client()
+                elif sock is self._wakeup_r:
+                    self._wakeup_r.recv(BUFFER_SIZE)
+                else:
+                    # A misbehaving client must not take down the only network thread
+                    try:
+                        self.read_client(sock)
+                    except Exception as e:
+                        print(f"⚠ Dropping client after error: {e}")
+                        self.drop_client(sock)
+            
+            if self._handshake_deadlines:
+                self.expire_handshakes()
+        
+        self.selector.close()
+        self.close_wakeup()
+    
+    def close_wakeup(self):
+        """Close both ends of the event loop's wake-up socketpair"""
+        for sock in (self._wakeup_r, self._wakeup_w):
             try:
-                self.server_socket.settimeout(1.0)
-                try:
-                    client_socket, addr = self.server_socket.accept()
-                except socket.timeout:
-                    continue
-                
-                if len(self.clients) >= 2:
-                    client_socket.send(b"ERROR:MAX_CLIENTS")
-                    client_socket.close()
-                    continue
-                
-                # Receive client info
-                client_socket.settimeout(5.0)
-                data = client_socket.recv(BUFFER_SIZE).decode()
-                client_info = json.loads(data)
-                
-                position = client_info.get("position", "right")
-                self.client_positions[client_socket] = position
-                self.clients.append(client_socket)
-                
-                print(f"✓ Client connected: {addr[0]} ({position})")
-                print(f"  Active clients: {len(self.clients)}/2\n")
-                
-                # Send acknowledgment
-                response = json.dumps({
-                    "status": "connected",
-                    "server_screen": {"width": self.screen_width, "height": self.screen_height}
-                })
-                client_socket.send(response.encode())
-                client_socket.settimeout(None)
-                
-                # Handle client in separate thread
-                threading.Thread(target=self.handle_client, args=(client_socket,), daemon=True).start()
-                
-            except Exception as e:
-                if self.running:
-                    pass  # Silently ignore connection errors
+                sock.close()
+            except OSError:
+                pass
+    
+    def expire_handshakes(self):
+        """Drop connections that did not send their handshake in time"""
+        now = time.monotonic()
+        for client_socket, deadline in list(self._handshake_deadlines.items()):
+            if deadline <= now:
+                self.drop_client(client_socket)
     
-    def handle_client(self, client_socket):
-        """Handle individual client connection"""
+    def accept_client(self):
+        """Accept a pending connection and wait for its handshake"""
         try:
-            while self.running:
-                client_socket.settimeout(1.0)
+            client_socket, addr = self.server_socket.accept()
+        except OSError:
+            # Nothing pending, or the connection was reset before we got to it
+            return
+        
+        try:
+            client_socket.setblocking(True)
+            tune_socket(client_socket)
+            
+            if len(self.clients) >= 2:
                 try:
-                    data = client_socket.recv(BUFFER_SIZE)
-                    if not data:
-                        break
-                    
-                    # Check for "return to server" message
-                    try:
-                        msg = json.loads(data.decode())
-                        if msg.get("type") == "return_to_server":
-                            self.current_screen = "server"
-                            self.active_client = None
-                            print("← Returned to server")
-                    except:
-                        pass
-                except socket.timeout:
-                    continue
-                    
-        except:
-            pass
-        finally:
-            if client_socket in self.clients:
-                self.clients.remove(client_socket)
-                if client_socket in self.client_positions:
-                    del self.client_positions[client_socket]
-            try:
+                    client_socket.sendall(encode_json_frame({"status": "error", "error": "max_clients"}))
+                except OSError:
+                    pass
                 client_socket.close()
-            except:
+                return
+            
+            self.client_buffers[client_socket] = bytearray()
+            self._handshake_deadlines[client_socket] = time.monotonic() + HANDSHAKE_TIMEOUT
+            self.selector.register(client_socket, selectors.EVENT_READ, addr)
+        except (OSError, ValueError):
+            self.drop_client(client_socket)
+    
+    def read_client(self, client_socket):
+        """Read whatever a readable client socket has and handle its messages"""
+        try:
+            # The socket stays blocking for the sender thread; don't let a
+            # spurious wake-up stall the loop on POSIX
+            data = client_socket.recv(BUFFER_SIZE, RECV_NOWAIT)
+            if data:
+                quickack(client_socket)
+                buffer = self.client_buffers[client_socket]
+                buffer += data
+                messages, consumed = decode_frames(buffer)
+                del buffer[:consumed]
+        except (BlockingIOError, InterruptedError):
+            return
+        except (OSError, ValueError):
+            data = b""
+        
+        if not data:
+            self.drop_client(client_socket)
+            return
+        
+        for msg in messages:
+            if client_socket not in self.client_positions:
+                if msg[0] == TYPE_JSON:
+                    self.register_client(client_socket, msg[1])
+                    if client_socket not in self.client_positions:
+                        return  # rejected and dropped
+            elif msg[0] == TYPE_RETURN:
+                self.return_to_server()
+    
+    def register_client(self, client_socket, client_info):
+        """Complete the handshake for a newly connected client"""
+        self._handshake_deadlines.pop(client_socket, None)
+        addr = self.selector.get_key(client_socket).data
+        position = client_info.get("position", "right") if isinstance(client_info, dict) else None
+        if position not in ("left", "right"):
+            print(f"✗ Rejected client {addr[0]}: invalid handshake")
+            self.drop_client(client_socket)
+            return
+        
+        # Several connections may have been accepted before any of them
+        # finished its handshake, so the limit is enforced here too
+        if len(self.clients) >= 2:
+            try:
+                client_socket.sendall(encode_json_frame({"status": "error", "error": "max_clients"}))
+            except OSError:
                 pass
+            self.drop_client(client_socket)
+            return
+        
+        # Send acknowledgment before the sender thread can see the socket,
+        # the client takes the first frame it receives as the ack
+        try:
+            client_socket.sendall(self._handshake_bytes)
+        except OSError:
+            self.drop_client(client_socket)
+            return
+        
+        self.client_positions[client_socket] = position
+        # The first client on a side keeps it, as with the old scan
+        self._by_position.setdefault(position, client_socket)
+        self.clients.append(client_socket)
+        self._clients_set.add(client_socket)
+        
+        print(f"✓ Client connected: {addr[0]} ({position})")
+        print(f"  Active clients: {len(self.clients)}/2\n")
+    
+    def drop_client(self, client_socket):
+        """Forget a disconnected client"""
+        try:
+            self.selector.unregister(client_socket)
+        except (KeyError, ValueError):
+            pass
+        self.client_buffers.pop(client_socket, None)
+        self._handshake_deadlines.pop(client_socket, None)
+        
+        was_client = client_socket in self._clients_set
+        if was_client:
+            self.clients.remove(client_socket)
+            self._clients_set.discard(client_socket)
+            position = self.client_positions.pop(client_socket, None)
+            if self._by_position.get(position) is client_socket:
+                del self._by_position[position]
+                # Hand the side to another client registered there, if any
+                for other, other_pos in self.client_positions.items():
+                    if other_pos == position:
+                        self._by_position[position] = other
+                        break
+            if self.active_client is client_socket:
+                self.return_to_server()
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+        if was_client:
             print(f"✗ Client disconnected. Active: {len(self.clients)}/2")
     
     def capture_input(self):
         """Capture mouse and keyboard input"""
-        from pynput import mouse, keyboard
+        mouse, keyboard = load_pynput()
+        
+        # Locals for the hot move callback (avoids attribute lookups per event)
+        queue_frame = self.queue_frame
+        pack_move = functools.partial(MOVE_FRAME.pack, MOVE_BODY.size, TYPE_MOVE)
+        pack_click = functools.partial(CLICK_FRAME.pack, CLICK_BODY.size, TYPE_CLICK)
+        pack_scroll = functools.partial(SCROLL_FRAME.pack, SCROLL_BODY.size, TYPE_SCROLL)
+        pack_key = functools.partial(KEY_FRAME.pack, KEY_BODY.size, TYPE_KEY)
+        scale_x = self._move_scale_x
+        scale_y = self._move_scale_y
+        switch_to_client = self.switch_to_client
+        right_edge = self.screen_width - 1
+        
+        # Every click frame is known up front: (button, pressed) -> encoded frame.
+        # Other buttons are sent as right clicks, as before
+        click_frames = {}
+        for button_id, name in enumerate(MOUSE_BUTTONS):
+            button = getattr(mouse.Button, name, None)
+            if button is not None:
+                for pressed in (False, True):
+                    click_frames[button, pressed] = pack_click(button_id, pressed)
+        right_button_id = MOUSE_BUTTONS.index("right")
+        
+        # Wire ids of special keys (index into SPECIAL_KEYS), built once
+        special_key_ids = {}
+        for key_id, name in enumerate(SPECIAL_KEYS):
+            special_key = getattr(keyboard.Key, name, None)
+            if special_key is not None:
+                special_key_ids.setdefault(special_key, key_id)
+        
+        def key_frame(key, pressed):
+            key_id = special_key_ids.get(key)
+            if key_id is not None:
+                return pack_key(pressed, key_id)
+            # Character keys send the char itself; keys the client can't map are dropped
+            char = getattr(key, "char", None)
+            if char:
+                return encode_char_frame(char, pressed)
+            return None
+        
+        # Encoded frame per (key, pressed); a keyboard only has so many keys
+        key_frames = {}
+        
+        def send_key(key, pressed):
+            try:
+                frame = key_frames[key, pressed]
+            except KeyError:
+                frame = key_frames[key, pressed] = key_frame(key, pressed)
+            if frame is not None:
+                queue_frame(frame)
         
         def on_move(x, y):
             if self.current_screen == "server":
                 # Check if mouse moved to edge
-                if x >= self.screen_width - 1:
-                    self.switch_to_client("right", 0, y)
+                if x >= right_edge:
+                    switch_to_client("right", 0, y)
                 elif x <= 0:
-                    self.switch_to_client("left", self.screen_width - 1, y)
+                    switch_to_client("left", right_edge, y)
             else:
-                # Send mouse movement to active client
-                self.send_to_active_client({
-                    "type": "mouse_move",
-                    "x": x,
-                    "y": y
-                })
+                # Send normalized mouse position to active client
+                # Clamp: positions past the primary screen don't fit the frame
+                queue_frame(pack_move(min(max(round(x * scale_x), 0), MOVE_RANGE),
+                                      min(max(round(y * scale_y), 0), MOVE_RANGE)))
         
         def on_click(x, y, button, pressed):
             if self.current_screen != "server":
-                self.send_to_active_client({
-                    "type": "mouse_click",
-                    "x": x,
-                    "y": y,
-                    "button": str(button),
-                    "pressed": pressed
-                })
+                frame = click_frames.get((button, pressed))
+                if frame is None:
+                    frame = pack_click(right_button_id, pressed)
+                queue_frame(frame)
         
         def on_scroll(x, y, dx, dy):
             if self.current_screen != "server":
-                self.send_to_active_client({
-                    "type": "mouse_scroll",
-                    "dx": dx,
-                    "dy": dy
-                })
+                queue_frame(pack_scroll(int(dx), int(dy)))
         
         def on_press(key):
             if self.current_screen != "server":
-                try:
-                    key_str = str(key).replace("'", "")
-                    self.send_to_active_client({
-                        "type": "key_press",
-                        "key": key_str
-                    })
-                except:
-                    pass
+                send_key(key, True)
         
         def on_release(key):
             if self.current_screen != "server":
-                try:
-                    key_str = str(key).replace("'", "")
-                    self.send_to_active_client({
-                        "type": "key_release",
-                        "key": key_str
-                    })
-                except:
-                    pass
+                send_key(key, False)
         
         # Start listeners
         mouse_listener = mouse.Listener(on_move=on_move, on_click=on_click, on_scroll=on_scroll)
@@ -482,41 +1170,95 @@ class KVMServer:
     
     def switch_to_client(self, position, x, y):
         """Switch control to a client"""
-        for client_socket, client_pos in self.client_positions.items():
-            if client_pos == position:
-                self.current_screen = position
-                self.active_client = client_socket
-                print(f"→ Switched to {position} client")
-                
-                # Send switch command
-                self.send_to_active_client({
-                    "type": "switch",
-                    "x": x,
-                    "y": y
-                })
-                return
+        client_socket = self._by_position.get(position)
+        if client_socket is None:
+            return
+        
+        self.current_screen = position
+        self.active_client = client_socket
+        print(f"→ Switched to {position} client")
+        
+        # Send switch command (scaled like mouse moves)
+        self.queue_frame(self._pack_switch(
+            min(max(round(x * self._move_scale_x), 0), MOVE_RANGE),
+            min(max(round(y * self._move_scale_y), 0), MOVE_RANGE)))
     
-    def send_to_active_client(self, data):
-        """Send data to active client"""
-        if self.active_client and self.active_client in self.clients:
-            try:
-                self.active_client.send(json.dumps(data).encode())
-            except:
-                pass
+    def return_to_server(self):
+        """Take control back from the active client"""
+        if self.current_screen != "server":
+            self.current_screen = "server"
+            self.active_client = None
+            print("← Returned to server")
+    
+    def queue_frame(self, frame):
+        """Queue an encoded frame for the active client"""
+        client = self.active_client
+        if client is not None and client in self._clients_set:
+            with self._sendq_cv:
+                # Only the latest position matters, so collapse consecutive moves
+                if (frame_type(frame) == TYPE_MOVE and self._sendq
+                        and self._sendq[-1][0] is client
+                        and frame_type(self._sendq[-1][1]) == TYPE_MOVE):
+                    self._sendq[-1] = (client, frame)
+                else:
+                    self._sendq.append((client, frame))
+                self._sendq_cv.notify()
+    
+    def sender_loop(self):
+        """Drain queued messages, one sendall per client per batch"""
+        next_send = 0.0
+        while self.running:
+            with self._sendq_cv:
+                self._sendq_cv.wait_for(lambda: self._sendq or not self.running)
+            
+            # After idle the first event goes out at once; during a burst moves
+            # keep collapsing in the queue until the interval has passed
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._sendq_cv:
+                batch = list(self._sendq)
+                self._sendq.clear()
+            
+            pending = {}
+            for client, frame in batch:
+                pending.setdefault(client, []).append(frame)
+            
+            for client, frames in pending.items():
+                try:
+                    send_frames(client, frames)
+                except OSError:
+                    self.abort_client(client)
+            next_send = time.monotonic() + SEND_INTERVAL
+    
+    def abort_client(self, client_socket):
+        """Stop sending to a broken client; the event loop then drops it"""
+        if self.active_client is client_socket:
+            self.return_to_server()
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
     
     def stop(self):
         """Stop the server"""
         print("\n\n→ Shutting down server...")
         self.running = False
+        with self._sendq_cv:
+            self._sendq_cv.notify()
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
         for client in self.clients:
             try:
                 client.close()
-            except:
+            except OSError:
                 pass
         if self.server_socket:
             try:
                 self.server_socket.close()
-            except:
+            except OSError:
                 pass
         print("✓ Server stopped")
 
@@ -524,34 +1266,46 @@ class KVMClient:
     """Client that receives mouse and keyboard control"""
     
     def __init__(self, server_ip, position="right", port=PORT):
-        from pynput import mouse, keyboard
+        mouse, keyboard = load_pynput()
         
         self.server_ip = server_ip
         self.position = position
         self.port = port
         self.socket = None
         self.running = False
+        # Frames are received straight into one preallocated buffer
+        self._rx = bytearray(RECV_BUFFER_SIZE)
+        self._rx_view = memoryview(self._rx)
+        self._rx_len = 0
+        self.pending_commands = []
+        self._close_mover = None
         self.mouse_controller = mouse.Controller()
         self.keyboard_controller = keyboard.Controller()
-        self.screen_width = 1920
-        self.screen_height = 1080
+        self.screen_width, self.screen_height = get_screen_size()
+        self._client_info = encode_json_frame({
+            "position": self.position,
+            "screen": {"width": self.screen_width, "height": self.screen_height}
+        })
+        self._return_msg = RETURN_FRAME.pack(RETURN_BODY.size, TYPE_RETURN)
+        self._return_sent = False
         
-        # Get screen dimensions
-        try:
-            system = get_platform()
-            if system == "linux":
-                import tkinter as tk
-                root = tk.Tk()
-                self.screen_width = root.winfo_screenwidth()
-                self.screen_height = root.winfo_screenheight()
-                root.destroy()
-            elif system == "windows":
-                import ctypes
-                user32 = ctypes.windll.user32
-                self.screen_width = user32.GetSystemMetrics(0)
-                self.screen_height = user32.GetSystemMetrics(1)
-        except:
-            pass
+        # Mouse buttons and special keys indexed by their wire id, built once per client
+        Button = mouse.Button
+        self._buttons = tuple(getattr(Button, name, None) for name in MOUSE_BUTTONS)
+        self._btn_default = Button.right
+        Key = keyboard.Key
+        self._key_table = tuple(getattr(Key, name, None) for name in SPECIAL_KEYS)
+        # pynput would parse a plain character into a KeyCode on every press
+        self._char_key = functools.lru_cache(maxsize=256)(keyboard.KeyCode.from_char)
+        
+        # Frame type -> handler, one dict lookup per command
+        self._dispatch = {
+            TYPE_SWITCH: self._do_switch,
+            TYPE_CLICK: self._do_click,
+            TYPE_SCROLL: self._do_scroll,
+            TYPE_KEY: self._do_key,
+            TYPE_CHAR: self._do_char,
+        }
     
     def connect(self):
         """Connect to server"""
@@ -564,30 +1318,36 @@ class KVMClient:
         
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            tune_socket(self.socket)
+            # Set before connect so the window scale is negotiated for it
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RECV_BUFFER)
             self.socket.settimeout(10.0)
             self.socket.connect((self.server_ip, self.port))
             
             # Send client info
-            client_info = json.dumps({
-                "position": self.position,
-                "screen": {"width": self.screen_width, "height": self.screen_height}
-            })
-            self.socket.send(client_info.encode())
+            self.socket.sendall(self._client_info)
             
-            # Receive acknowledgment
-            response = self.socket.recv(BUFFER_SIZE).decode()
-            data = json.loads(response)
+            # Receive acknowledgment (commands may follow it in the same packet)
+            messages = []
+            while not messages:
+                received = self.socket.recv_into(self._rx_view[self._rx_len:])
+                if not received:
+                    raise ConnectionError("Server closed the connection")
+                self._rx_len += received
+                messages = self._decode_received()
+            kind, *fields = messages.pop(0)
+            data = fields[0] if kind == TYPE_JSON else {}
+            self.pending_commands = messages
             
             if data.get("status") == "connected":
                 print(f"✓ Connected successfully!")
                 print(f"\nWaiting for control...")
                 print(f"Press Ctrl+C to disconnect")
                 print(f"{'='*60}\n")
-                self.socket.settimeout(None)
                 self.running = True
                 self.receive_commands()
             else:
-                print(f"✗ Connection failed: {response}")
+                print(f"✗ Connection failed: {data}")
                 
         except socket.timeout:
             print("\n✗ Connection timed out")
@@ -600,143 +1360,193 @@ class KVMClient:
     
     def receive_commands(self):
         """Receive and execute commands from server"""
-        from pynput.mouse import Button
-        from pynput.keyboard import Key, KeyCode
+        # Moves are the bulk of the traffic, bind their state once per session
+        self._dispatch[TYPE_MOVE] = self._make_move_handler()
+        execute = self.execute_command
+        sock = self.socket
+        recv_into = sock.recv_into
+        rx_view = self._rx_view
+        capacity = len(self._rx)
         
-        while self.running:
-            try:
-                self.socket.settimeout(1.0)
-                try:
-                    data = self.socket.recv(BUFFER_SIZE)
-                    if not data:
-                        break
-                except socket.timeout:
-                    continue
-                
-                cmd = json.loads(data.decode())
-                cmd_type = cmd.get("type")
-                
-                if cmd_type == "switch":
-                    print("→ Control active on this computer")
-                    x, y = cmd.get("x", 0), cmd.get("y", self.screen_height // 2)
-                    self.mouse_controller.position = (x, y)
-                
-                elif cmd_type == "mouse_move":
-                    x, y = cmd.get("x"), cmd.get("y")
-                    
-                    # Check if mouse moved to edge to return to server
-                    if (self.position == "right" and x >= self.screen_width - 1) or \
-                       (self.position == "left" and x <= 0):
-                        # Return control to server
-                        print("← Returning control to server")
-                        self.socket.send(json.dumps({"type": "return_to_server"}).encode())
-                    else:
-                        self.mouse_controller.position = (x, y)
+        sock.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(sock, selectors.EVENT_READ)
+        
+        try:
+            while self.running:
+                commands, self.pending_commands = self.pending_commands, []
+                for cmd in commands:
+                    execute(cmd)
                 
-                elif cmd_type == "mouse_click":
-                    button = Button.left if "left" in cmd.get("button", "").lower() else Button.right
-                    if cmd.get("pressed"):
-                        self.mouse_controller.press(button)
-                    else:
-                        self.mouse_controller.release(button)
+                # Wake up now and then to notice stop(); on Windows this also
+                # lets Ctrl+C through, which select() does not deliver
+                if not selector.select(1.0):
+                    continue
                 
-                elif cmd_type == "mouse_scroll":
-                    dx, dy = cmd.get("dx", 0), cmd.get("dy", 0)
-                    self.mouse_controller.scroll(dx, dy)
+                # Drain everything that already arrived in one wake-up so stale moves can be skipped
+                closed = False
+                while self._rx_len < capacity:
+                    try:
+                        received = recv_into(rx_view[self._rx_len:])
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    if not received:
+                        closed = True
+                        break
+                    self._rx_len += received
+                quickack(sock)
                 
-                elif cmd_type == "key_press":
-                    self.handle_key(cmd.get("key"), True)
+                self.pending_commands = coalesce_moves(self._decode_received())
                 
-                elif cmd_type == "key_release":
-                    self.handle_key(cmd.get("key"), False)
+                if closed:
+                    for cmd in self.pending_commands:
+                        execute(cmd)
+                    break
                 
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.running:
-                    print(f"✗ Error: {e}")
-                break
+        except Exception as e:
+            if self.running:
+                print(f"✗ Error: {e}")
+        finally:
+            selector.close()
+            self.close_mover()
         
         print("\n✗ Disconnected from server")
     
-    def handle_key(self, key_str, is_press):
-        """Handle keyboard events"""
-        try:
-            from pynput.keyboard import Key, KeyCode
+    def _decode_received(self):
+        """Decode the complete frames received so far and keep the partial tail"""
+        messages, consumed = decode_frames(self._rx, self._rx_len)
+        if consumed:
+            # Move the tail to the front in place (the buffer never grows)
+            rest = self._rx_len - consumed
+            self._rx[:rest] = self._rx_view[consumed:self._rx_len]
+            self._rx_len = rest
+        return messages
+    
+    def close_mover(self):
+        """Release the native mouse mover (destroys the uinput device)"""
+        close, self._close_mover = self._close_mover, None
+        if close is not None:
+            close()
+    
+    def execute_command(self, cmd):
+        """Apply a single command from the server"""
+        handler = self._dispatch.get(cmd[0])
+        if handler:
+            handler(cmd)
+    
+    def _do_switch(self, cmd):
+        """Take control: place the cursor where it entered"""
+        print("→ Control active on this computer")
+        self._return_sent = False
+        _, x, y = cmd
+        x = round(x * (self.screen_width - 1) / MOVE_RANGE)
+        y = round(y * (self.screen_height - 1) / MOVE_RANGE)
+        self.mouse_controller.position = (x, y)
+    
+    def _make_move_handler(self):
+        """Build the mouse_move handler with screen and socket state bound as locals"""
+        sw, sh = self.screen_width, self.screen_height
+        send_return = functools.partial(self.socket.sendall, self._return_msg)
+        pos_right = self.position == "right"
+        edge_x = sw - 1
+        scale_x = (sw - 1) / MOVE_RANGE
+        scale_y = (sh - 1) / MOVE_RANGE
+        _round = round
+        
+        native = native_mouse_mover(sw, sh)
+        if native is None:
+            mc = self.mouse_controller
             
-            # Map special keys
-            key_map = {
-                "Key.space": Key.space,
-                "Key.enter": Key.enter,
-                "Key.tab": Key.tab,
-                "Key.backspace": Key.backspace,
-                "Key.esc": Key.esc,
-                "Key.shift": Key.shift,
-                "Key.shift_r": Key.shift_r,
-                "Key.ctrl": Key.ctrl,
-                "Key.ctrl_r": Key.ctrl_r,
-                "Key.alt": Key.alt,
-                "Key.alt_r": Key.alt_r,
-                "Key.up": Key.up,
-                "Key.down": Key.down,
-                "Key.left": Key.left,
-                "Key.right": Key.right,
-                "Key.delete": Key.delete,
-                "Key.home": Key.home,
-                "Key.end": Key.end,
-                "Key.page_up": Key.page_up,
-                "Key.page_down": Key.page_down,
-            }
+            def move_to(x, y):
+                mc.position = (x, y)
+        else:
+            # The device lives for this session, receive_commands closes it
+            move_to, self._close_mover = native
+        
+        def do_move(cmd):
+            x = _round(cmd[1] * scale_x)
+            y = _round(cmd[2] * scale_y)
             
-            if key_str in key_map:
-                key = key_map[key_str]
-            elif len(key_str) == 1:
-                key = key_str
+            # Check if mouse moved to edge to return to server
+            if (x >= edge_x) if pos_right else (x <= 0):
+                # Return control to server (once, moves still queued behind the edge are ignored)
+                if not self._return_sent:
+                    self._return_sent = True
+                    print("← Returning control to server")
+                    send_return()
             else:
-                return
-            
+                move_to(x, y)
+        
+        return do_move
+    
+    def _do_click(self, cmd):
+        """Press or release a mouse button"""
+        _, button_id, pressed = cmd
+        button = self._buttons[button_id] if button_id < len(self._buttons) else None
+        if button is None:
+            button = self._btn_default
+        if pressed:
+            self.mouse_controller.press(button)
+        else:
+            self.mouse_controller.release(button)
+    
+    def _do_scroll(self, cmd):
+        """Scroll the mouse wheel"""
+        self.mouse_controller.scroll(cmd[1], cmd[2])
+    
+    def _do_key(self, cmd):
+        """Press or release a special key"""
+        _, pressed, key_id = cmd
+        if key_id < len(self._key_table):
+            self.handle_key(self._key_table[key_id], pressed)
+    
+    def _do_char(self, cmd):
+        """Press or release a character key"""
+        _, pressed, char = cmd
+        self.handle_key(self._char_key(char), pressed)
+    
+    def handle_key(self, key, is_press):
+        """Handle keyboard events"""
+        if key is None:
+            return
+        
+        try:
             if is_press:
                 self.keyboard_controller.press(key)
             else:
                 self.keyboard_controller.release(key)
-        except:
+        except Exception:
+            # The local layout may not be able to type this character
             pass
     
     def stop(self):
         """Stop the client"""
         self.running = False
+        self.close_mover()
         if self.socket:
             try:
                 self.socket.close()
             except:
                 pass
 
-def main_menu():
-    """Main menu interface"""
-    print_header()
-    
+def choose_action():
+    """Show the main menu and return the chosen action, or None"""
     print("\n1. Run as Server (share your mouse/keyboard)")
     print("2. Run as Client (receive control)")
-    print("3. Cleanup (remove venv and config)")
+    print("3. Cleanup (remove venv and config, optionally the package cache)")
     print("4. Exit")
     
     choice = input("\nSelect option (1-4): ").strip()
     
     if choice == "1":
-        # Server mode
-        server = KVMServer()
-        try:
-            server.start()
-        except KeyboardInterrupt:
-            server.stop()
+        return ("server",)
     
     elif choice == "2":
-        # Client mode
         print("\n" + "-"*60)
         server_ip = input("Enter server IP address: ").strip()
         if not server_ip:
             print("✗ Invalid IP address")
-            return
+            return None
         
         print("\nClient position:")
         print("  1. Right of server (move mouse RIGHT to switch)")
@@ -744,7 +1554,36 @@ def main_menu():
         pos_choice = input("Select (1-2): ").strip()
         
         position = "right" if pos_choice == "1" else "left"
-        
+        return ("client", server_ip, position)
+    
+    elif choice == "3":
+        confirm = input("\nDelete venv and config? (yes/no): ").strip().lower()
+        if confirm == "yes":
+            # The cache makes the next setup skip venv creation and downloads
+            purge = input("Also delete the package cache? (yes/no): ").strip().lower()
+            return ("cleanup", purge == "yes")
+        print("Cancelled")
+        return None
+    
+    elif choice == "4":
+        return ("exit",)
+    
+    print("\n✗ Invalid option")
+    return None
+
+def run_action(action):
+    """Run an action returned by choose_action"""
+    kind = action[0]
+    
+    if kind == "server":
+        server = KVMServer()
+        try:
+            server.start()
+        except KeyboardInterrupt:
+            server.stop()
+    
+    elif kind == "client":
+        _, server_ip, position = action
         client = KVMClient(server_ip, position)
         try:
             client.connect()
@@ -752,20 +1591,12 @@ def main_menu():
             print("\n\n→ Disconnecting...")
             client.stop()
     
-    elif choice == "3":
-        # Cleanup
-        confirm = input("\nDelete all KVM data? (yes/no): ").strip().lower()
-        if confirm == "yes":
-            cleanup()
-        else:
-            print("Cancelled")
+    elif kind == "cleanup":
+        cleanup(action[1])
     
-    elif choice == "4":
+    elif kind == "exit":
         print("\nGoodbye!")
         sys.exit(0)
-    
-    else:
-        print("\n✗ Invalid option")
 
 def main():
     """Main entry point"""
@@ -796,10 +1627,13 @@ def main():
         else:
             sys.exit(1)
     
-    # Run main menu loop
+    # Run main menu loop (setup and checks above happen once)
+    print_header()
     try:
         while True:
-            main_menu()
+            action = choose_action()
+            if action is not None:
+                run_action(action)
     except KeyboardInterrupt:
         print("\n\nExiting...")
         sys.exit(0)